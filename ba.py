@@ -1,132 +1,108 @@
 import networkx as nx
+import matplotlib
+matplotlib.use('Agg')  # headless: figures are saved, never shown
 import matplotlib.pyplot as plt
-import random
-
-# random seed for reproducibility
-random.seed(42)
+import numpy as np
+import os
+from illusion_core import (
+    OPINION_LABELS, make_graph, influencers, global_majority, illusion_mask, diffuse
+)
 
 # Parameters
 N = 1000                    # Number of nodes
 m = 2                      # Edges per new node in BA model
 phi = 0.5                  # Threshold for adoption
 max_rounds = 50            # Max rounds for dynamic simulation
+fig_dir = 'figures'        # Output directory for saved plots
 
-def identify_influencers_by_threshold(G):
+def identify_influencers_by_threshold(deg):
     """Identify influencers as nodes whose degree exceeds twice the average."""
-    avg_deg = sum(dict(G.degree()).values()) / G.number_of_nodes()
-    threshold = 2 * avg_deg
-    influencers = {n for n, d in G.degree() if d > threshold}
-    print(f"Average degree = {avg_deg:.2f}, threshold = {threshold:.2f}")
-    print(f"Number of influencers: {len(influencers)}")
-    return influencers
-
-def static_majority_illusion(G, opinions):
-    """Compute nodes under strict majority illusion."""
-    total_red = sum(1 for v in opinions.values() if v == 'Red')
-    total_blue = len(opinions) - total_red
-    global_maj = 'Red' if total_red > total_blue else 'Blue'
-    illusion_nodes = []
-    for v in G.nodes():
-        nbrs = list(G.neighbors(v))
-        if not nbrs:
-            continue
-        local_red = sum(opinions[u] == 'Red' for u in nbrs)
-        local_blue = len(nbrs) - local_red
-        if local_red == local_blue:
-            continue
-        local_maj = 'Red' if local_red > local_blue else 'Blue'
-        if local_maj != global_maj:
-            illusion_nodes.append(v)
-    return global_maj, illusion_nodes
+    avg_deg = deg.mean()
+    infl = influencers(deg)
+    print(f"Average degree = {avg_deg:.2f}, threshold = {2 * avg_deg:.2f}")
+    print(f"Number of influencers: {len(infl)}")
+    return infl
 
-def plot_static_illusion(G, opinions, illusion_nodes):
+def plot_static_illusion(G, pos, x, illusion_nodes):
     """Static network plot with illusioned nodes."""
-    pos = nx.spring_layout(G, seed=42)
-    colors = ['red' if opinions[v]=='Red' else 'skyblue' for v in G]
-    shapes = {v: ('s' if v in illusion_nodes else 'o') for v in G}
+    colors = np.where(x == 1, 'red', 'skyblue')
+    in_illusion = np.zeros(len(x), dtype=bool)
+    in_illusion[illusion_nodes] = True
     
-    plt.figure(figsize=(8,6))
-    for shape in ['o','s']:
-        nodes = [v for v in G if shapes[v]==shape]
+    fig = plt.figure(figsize=(8,6))
+    for shape, mask in [('o', ~in_illusion), ('s', in_illusion)]:
+        nodes = np.flatnonzero(mask)
         nx.draw_networkx_nodes(
-            G, pos, nodelist=nodes,
-            node_color=[colors[v] for v in nodes],
+            G, pos, nodelist=nodes.tolist(),
+            node_color=colors[nodes].tolist(),
             node_shape=shape, edgecolors='black', linewidths=1.0, node_size=300
         )
     nx.draw_networkx_edges(G, pos, alpha=0.5)
-    plt.title(f"Static Illusion (n_influencers={sum(1 for v in opinions if opinions[v]=='Red')})")
+    plt.title(f"Static Illusion (n_influencers={int(x.sum())})")
     plt.axis('off')
-    plt.show()
-
-def dynamic_simulation(G, opinions_init):
-    """Run threshold diffusion, track illusion counts, and return final opinions."""
-    opinions = opinions_init.copy()
-    illusion_series = []
-    for _ in range(max_rounds):
-        _, illusion_nodes = static_majority_illusion(G, opinions)
-        illusion_series.append(len(illusion_nodes))
-        # update opinions
-        new_op = opinions.copy()
-        for v in G.nodes():
-            if opinions[v] == 'Blue':
-                red_nbrs = sum(opinions[u]=='Red' for u in G.neighbors(v))
-                if red_nbrs > phi * G.degree[v]:
-                    new_op[v] = 'Red'
-        if new_op == opinions:
-            break
-        opinions = new_op
-    return illusion_series, opinions
+    return fig
 
 def plot_illusion_development(illusion_series):
     """Plot the number of illusioned nodes over time."""
-    plt.figure(figsize=(6,4))
+    fig = plt.figure(figsize=(6,4))
     plt.plot(range(len(illusion_series)), illusion_series, marker='s')
     plt.title("Development of Majority Illusion Over Time")
     plt.xlabel("Round")
     plt.ylabel("Number of Nodes Under Illusion")
     plt.grid(True)
-    plt.show()
+    return fig
 
-def plot_network_evolution(G, opinions_start, opinions_end):
+def plot_network_evolution(G, pos, x_start, x_end):
     """Show initial vs final network coloring."""
-    pos = nx.spring_layout(G, seed=42)
-    plt.figure(figsize=(12,5))
+    fig = plt.figure(figsize=(12,5))
     
     # Initial
     plt.subplot(1,2,1)
-    colors_start = ['red' if opinions_start[v]=='Red' else 'skyblue' for v in G]
+    colors_start = np.where(x_start == 1, 'red', 'skyblue').tolist()
     nx.draw(G, pos, node_color=colors_start, with_labels=False, node_size=300, edge_color='gray')
     plt.title("t = 0 (Initial Opinions)")
     plt.axis('off')
     
     # Final
     plt.subplot(1,2,2)
-    colors_end = ['red' if opinions_end[v]=='Red' else 'skyblue' for v in G]
+    colors_end = np.where(x_end == 1, 'red', 'skyblue').tolist()
     nx.draw(G, pos, node_color=colors_end, with_labels=False, node_size=300, edge_color='gray')
     plt.title("t = final (Post-Diffusion)")
     plt.axis('off')
     
     plt.tight_layout()
-    plt.show()
+    return fig
 
 # Main execution
 if __name__ == "__main__":
+    os.makedirs(fig_dir, exist_ok=True)
+
     # Build network once
-    G = nx.barabasi_albert_graph(N, m, seed=42)
+    A, deg, edges = make_graph(N, m, seed=42)  # fixed seed for reproducibility
+    G = nx.from_scipy_sparse_array(A)  # only needed for plotting
+    pos = nx.spring_layout(G, seed=42)  # shared by all network plots
     
     # Identify influencers
-    influencers = identify_influencers_by_threshold(G)
+    infl = identify_influencers_by_threshold(deg)
     
-    # Static
-    opinions_init = {v: ('Red' if v in influencers else 'Blue') for v in G}
-    gm, illusion_nodes = static_majority_illusion(G, opinions_init)
-    print(f"Global majority: {gm}, Illusioned nodes: {len(illusion_nodes)}")
-    plot_static_illusion(G, opinions_init, illusion_nodes)
+    # Static (opinions as int8 vector: 1 = Red, 0 = Blue)
+    x_init = np.zeros(N, dtype=np.int8)
+    x_init[infl] = 1
+    gm = global_majority(x_init)
+    illusion_nodes = np.flatnonzero(illusion_mask(edges, deg, x_init))
+    print(f"Global majority: {OPINION_LABELS[gm]}, Illusioned nodes: {len(illusion_nodes)}")
+    fig = plot_static_illusion(G, pos, x_init, illusion_nodes)
+    fig.savefig(os.path.join(fig_dir, 'static_illusion.png'))
+    plt.close(fig)
     
     # Dynamic
-    illusion_series, opinions_final = dynamic_simulation(G, opinions_init)
+    illusion_series, x_final = diffuse(A, deg, x_init, phi, max_rounds)
     print(f"Final number under illusion: {illusion_series[-1]}")
-    plot_illusion_development(illusion_series)
+    fig = plot_illusion_development(illusion_series)
+    fig.savefig(os.path.join(fig_dir, 'illusion_development.png'))
+    plt.close(fig)
     
     # Network evolution
-    plot_network_evolution(G, opinions_init, opinions_final)
+    fig = plot_network_evolution(G, pos, x_init, x_final)
+    fig.savefig(os.path.join(fig_dir, 'network_evolution.png'))
+    plt.close(fig)
@@ -1,10 +1,20 @@
 import networkx as nx
+import matplotlib
+matplotlib.use('Agg')  # headless: figures are saved, never shown
 import matplotlib.pyplot as plt
+import numpy as np
+import argparse
+import os
 import random
-from statistics import mean, stdev
+from joblib import Parallel, delayed
+from illusion_core import (
+    OPINION_LABELS, make_graph, influencers, global_majority, illusion_mask, diffuse
+)
+from math import sqrt
 
 # Ensure reproducibility
 random.seed(42)
+rng = np.random.default_rng(42)
 
 # Parameters
 N = 1000                  # Total nodes
@@ -12,88 +22,43 @@ m = 2                    # BA model parameter (edges per new node)
 phi = 0.5                # Majority threshold
 max_rounds = 50          # Max dynamic rounds
 minority_fracs = [0.10, 0.30, 0.40]  # Tested minority ratios
+fig_dir = 'figures'      # Output directory for saved plots
 
-def identify_influencers_by_threshold(G):
-    """Return set of nodes with degree > 2 × average degree."""
-    avg_deg = sum(dict(G.degree()).values()) / G.number_of_nodes()
-    threshold = 2 * avg_deg
-    return {v for v, d in G.degree() if d > threshold}
-
-def static_majority_illusion(G, opinions):
-    """Return (global_majority, list of nodes under strict majority illusion)."""
-    red = sum(op == 'Red' for op in opinions.values())
-    blue = len(opinions) - red
-    global_maj = 'Red' if red > blue else 'Blue'
-    illusion = []
-    for v in G:
-        nbrs = list(G.neighbors(v))
-        if not nbrs:
-            continue
-        r = sum(opinions[u] == 'Red' for u in nbrs)
-        b = len(nbrs) - r
-        if r == b:
-            continue
-        local = 'Red' if r > b else 'Blue'
-        if local != global_maj:
-            illusion.append(v)
-    return global_maj, illusion
-
-def dynamic_simulation(G, opinions_init):
-    """Run reversible majority-vote dynamics; return illusion count series and final opinions."""
-    opinions = opinions_init.copy()
-    illusion_series = []
-    for _ in range(max_rounds):
-        _, ill = static_majority_illusion(G, opinions)
-        illusion_series.append(len(ill))
-        new_op = {}
-        for v in G:
-            nbrs = list(G.neighbors(v))
-            if not nbrs:
-                new_op[v] = opinions[v]
-                continue
-            r = sum(opinions[u] == 'Red' for u in nbrs)
-            b = len(nbrs) - r
-            if r > b:
-                new_op[v] = 'Red'
-            elif b > r:
-                new_op[v] = 'Blue'
-            else:
-                new_op[v] = opinions[v]
-        if new_op == opinions:
-            break
-        opinions = new_op
-    return illusion_series, opinions
-
-def plot_static_illusion_detailed(G, opinions, influencers, extra, illusion_nodes, title):
+def plot_static_illusion_detailed(G, pos, x, infl_nodes, extra, illusion_nodes, title):
     """Plot static network, distinguishing influencers, extra minority, and majority."""
-    pos = nx.spring_layout(G, seed=42)
     # categorize nodes
-    infl = list(influencers)
-    extra_only = [v for v in extra if v not in influencers]
-    majority = [v for v in G if v not in influencers and v not in extra]
-    plt.figure(figsize=(8,6))
+    in_infl = np.zeros(len(x), dtype=bool)
+    in_infl[infl_nodes] = True
+    in_extra = np.zeros(len(x), dtype=bool)
+    in_extra[extra] = True
+    in_illusion = np.zeros(len(x), dtype=bool)
+    in_illusion[illusion_nodes] = True
+    infl = np.asarray(infl_nodes)
+    extra_only = np.flatnonzero(in_extra & ~in_infl)
+    majority = np.flatnonzero(~in_infl & ~in_extra)
+    fig = plt.figure(figsize=(8,6))
     # influencers: red triangles
     nx.draw_networkx_nodes(
-        G, pos, nodelist=infl,
+        G, pos, nodelist=infl.tolist(),
         node_color='red', node_shape='^', node_size=400,
         label='Influencers',
-        edgecolors=['black' if v in illusion_nodes else 'none' for v in infl],
+        edgecolors=np.where(in_illusion[infl], 'black', 'none').tolist(),
         linewidths=2
     )
     # extra minority: pink squares
     nx.draw_networkx_nodes(
-        G, pos, nodelist=extra_only,
+        G, pos, nodelist=extra_only.tolist(),
         node_color='pink', node_shape='s', node_size=300,
         label='Minority (extra)',
-        edgecolors=['black' if v in illusion_nodes else 'none' for v in extra_only],
+        edgecolors=np.where(in_illusion[extra_only], 'black', 'none').tolist(),
         linewidths=2
     )
     # majority: skyblue circles
     nx.draw_networkx_nodes(
-        G, pos, nodelist=majority,
+        G, pos, nodelist=majority.tolist(),
         node_color='skyblue', node_shape='o', node_size=300,
         label='Majority',
-        edgecolors=['black' if v in illusion_nodes else 'none' for v in majority],
+        edgecolors=np.where(in_illusion[majority], 'black', 'none').tolist(),
         linewidths=2
     )
     nx.draw_networkx_edges(G, pos, alpha=0.3)
@@ -101,118 +66,165 @@ def plot_static_illusion_detailed(G, opinions, influencers, extra, illusion_node
     plt.legend(scatterpoints=1, fontsize=10)
     plt.axis('off')
     plt.tight_layout()
-    plt.show()
+    return fig
 
 def plot_illusion_development(series, title):
     """Plot the number under illusion over each round."""
-    plt.figure(figsize=(5,4))
+    fig = plt.figure(figsize=(5,4))
     plt.plot(range(len(series)), series, marker='s')
     plt.title(title)
     plt.xlabel('Round')
     plt.ylabel('Nodes Under Illusion')
     plt.grid(True)
     plt.tight_layout()
-    plt.show()
+    return fig
 
-def plot_network_evolution(G, start, end, title):
+def plot_network_evolution(G, pos, start, end, title):
     """Side by side: initial vs. final network coloring."""
-    pos = nx.spring_layout(G, seed=42)
-    plt.figure(figsize=(10,4))
+    fig = plt.figure(figsize=(10,4))
     plt.subplot(1,2,1)
-    cols0 = ['red' if start[v]=='Red' else 'skyblue' for v in G]
+    cols0 = np.where(start == 1, 'red', 'skyblue').tolist()
     nx.draw(G, pos, node_color=cols0, node_size=200, edge_color='gray', with_labels=False)
     plt.title('t = 0'); plt.axis('off')
     plt.subplot(1,2,2)
-    cols1 = ['red' if end[v]=='Red' else 'skyblue' for v in G]
+    cols1 = np.where(end == 1, 'red', 'skyblue').tolist()
     nx.draw(G, pos, node_color=cols1, node_size=200, edge_color='gray', with_labels=False)
     plt.title('t = final'); plt.axis('off')
     plt.suptitle(title)
     plt.tight_layout()
-    plt.show()
+    return fig
+
+def run_once(seed):
+    """One batch run on a BA graph built from seed; return a record per minority fraction."""
+    rng_run = np.random.default_rng(seed)
+    A_run, deg_run, edges_run = make_graph(N, m, rng_run)
+    infl_run = influencers(deg_run)
+    icount = len(infl_run)
+    # frac-independent: influencer mask and the pool for random extras
+    infl_mask_run = np.zeros(N, dtype=bool)
+    infl_mask_run[infl_run] = True
+    rest_run = np.flatnonzero(~infl_mask_run)
+    records = []
+    for frac in minority_fracs:
+        target = int(frac * N)
+        # cap or fill minority as in the single-run scenarios
+        if icount > target:
+            minority_mask = np.zeros(N, dtype=bool)
+            top = infl_run[np.argpartition(-deg_run[infl_run], target)[:target]]
+            minority_mask[top] = True
+        else:
+            minority_mask = infl_mask_run.copy()
+            extra = target - icount
+            if extra > 0:
+                minority_mask[rng_run.choice(rest_run, size=extra, replace=False)] = True
+        x = minority_mask.astype(np.int8)
+        static_ct = int(illusion_mask(edges_run, deg_run, x).sum())
+        seq, _ = diffuse(A_run, deg_run, x, phi, max_rounds, reversible=True)
+        records.append({
+            'infl': icount,
+            'frac': frac,
+            'static': static_ct,
+            'final': seq[-1]
+        })
+    return records
+
+def summarize(records):
+    """Map (infl, frac) to (static mean, sd, final mean, sd) in one Welford pass over records."""
+    agg = {}
+    for r in records:
+        key = (r['infl'], r['frac'])
+        n, mean_s, m2_s, mean_f, m2_f = agg.get(key, (0, 0.0, 0.0, 0.0, 0.0))
+        n += 1
+        d = r['static'] - mean_s
+        mean_s += d / n
+        m2_s += d * (r['static'] - mean_s)
+        d = r['final'] - mean_f
+        mean_f += d / n
+        m2_f += d * (r['final'] - mean_f)
+        agg[key] = (n, mean_s, m2_s, mean_f, m2_f)
+    stats = {}
+    for key, (n, mean_s, m2_s, mean_f, m2_f) in agg.items():
+        s_sd = sqrt(m2_s / (n - 1)) if n > 1 else 0
+        f_sd = sqrt(m2_f / (n - 1)) if n > 1 else 0
+        stats[key] = (mean_s, s_sd, mean_f, f_sd)
+    return stats
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Majority illusion experiments on BA networks.")
+    parser.add_argument('--plot', action='store_true',
+                        help=f"save figures for the single-run scenarios to {fig_dir}/")
+    args = parser.parse_args()
+    if args.plot:
+        os.makedirs(fig_dir, exist_ok=True)
+
     # Single-run scenarios with random BA networks
     for frac in minority_fracs:
-        G = nx.barabasi_albert_graph(N, m, seed=random.randrange(10000))
-        influencers = identify_influencers_by_threshold(G)
+        A, deg, edges = make_graph(N, m, random.randrange(10000))
+        infl_nodes = influencers(deg)
         target = int(frac * N)
 
         # Cap influencer set if too large
-        if len(influencers) > target:
+        minority_mask = np.zeros(N, dtype=bool)
+        if len(infl_nodes) > target:
             # keep top-'target' hubs by degree
-            sorted_infl = sorted(influencers, key=lambda v: G.degree(v), reverse=True)
-            minority_set = set(sorted_infl[:target])
+            top = infl_nodes[np.argpartition(-deg[infl_nodes], target)[:target]]
+            minority_mask[top] = True
         else:
             # keep all influencers, then add random extras
-            minority_set = set(influencers)
-            rest = list(set(G.nodes()) - minority_set)
-            extra = target - len(minority_set)
+            minority_mask[infl_nodes] = True
+            rest = np.flatnonzero(~minority_mask)
+            extra = target - len(infl_nodes)
             if extra > 0:
-                minority_set |= set(random.sample(rest, extra))
+                minority_mask[rng.choice(rest, size=extra, replace=False)] = True
 
-        opinions_init = {v: 'Red' if v in minority_set else 'Blue' for v in G}
-        gm, illusion_nodes = static_majority_illusion(G, opinions_init)
-        title = f"Static Illusion: {int(frac*100)}% minority, {len(influencers)} influencers"
-        plot_static_illusion_detailed(
-            G, opinions_init, influencers, minority_set - influencers,
-            illusion_nodes, title
-        )
+        x_init = minority_mask.astype(np.int8)
+        gm = global_majority(x_init)
+        illusion_nodes = np.flatnonzero(illusion_mask(edges, deg, x_init))
+        if args.plot:
+            # the layout is the expensive part, so only build it when plotting
+            G = nx.from_scipy_sparse_array(A)
+            pos = nx.spring_layout(G, seed=42)  # shared by both network plots
+            title = f"Static Illusion: {int(frac*100)}% minority, {len(infl_nodes)} influencers"
+            fig = plot_static_illusion_detailed(
+                G, pos, x_init, infl_nodes, np.setdiff1d(np.flatnonzero(minority_mask), infl_nodes),
+                illusion_nodes, title
+            )
+            fig.savefig(os.path.join(fig_dir, f"static_{int(frac*100)}.png"))
+            plt.close(fig)
 
-        ill_series, final_op = dynamic_simulation(G, opinions_init)
-        print(f"{int(frac*100)}% | infl={len(influencers)} | global maj={gm}")
+        ill_series, x_final = diffuse(A, deg, x_init, phi, max_rounds, reversible=True)
+        print(f"{int(frac*100)}% | infl={len(infl_nodes)} | global maj={OPINION_LABELS[gm]}")
         print(f"  static={len(illusion_nodes)} | peak={max(ill_series)} | final={ill_series[-1]}")
 
-        plot_illusion_development(
-            ill_series,
-            f"Illusion Over Time: {int(frac*100)}% / infl={len(influencers)}"
-        )
-        plot_network_evolution(
-            G, opinions_init, final_op,
-            f"Network Evolution: {int(frac*100)}% / infl={len(influencers)}"
-        )
+        if args.plot:
+            fig = plot_illusion_development(
+                ill_series,
+                f"Illusion Over Time: {int(frac*100)}% / infl={len(infl_nodes)}"
+            )
+            fig.savefig(os.path.join(fig_dir, f"illusion_{int(frac*100)}.png"))
+            plt.close(fig)
+            fig = plot_network_evolution(
+                G, pos, x_init, x_final,
+                f"Network Evolution: {int(frac*100)}% / infl={len(infl_nodes)}"
+            )
+            fig.savefig(os.path.join(fig_dir, f"evolution_{int(frac*100)}.png"))
+            plt.close(fig)
 
-    # Batch simulations recording influencer count
+    # Batch simulations recording influencer count (independent runs in parallel)
     runs = 200
-    records = []
-    for run in range(runs):
-        G_run = nx.barabasi_albert_graph(N, m, seed=random.randrange(10000))
-        infl_run = identify_influencers_by_threshold(G_run)
-        icount = len(infl_run)
-        for frac in minority_fracs:
-            target = int(frac * N)
-            # cap or fill minority as above
-            if icount > target:
-                sorted_infl = sorted(infl_run, key=lambda v: G_run.degree(v), reverse=True)
-                minority = set(sorted_infl[:target])
-            else:
-                minority = set(infl_run)
-                rest = list(set(G_run.nodes()) - minority)
-                extra = target - len(minority)
-                if extra > 0:
-                    minority |= set(random.sample(rest, extra))
-            opinions = {v: 'Red' if v in minority else 'Blue' for v in G_run}
-            static_ct = len(static_majority_illusion(G_run, opinions)[1])
-            seq, _ = dynamic_simulation(G_run, opinions)
-            records.append({
-                'infl': icount,
-                'frac': frac,
-                'static': static_ct,
-                'final': seq[-1]
-            })
+    seeds = [random.randrange(10000) for _ in range(runs)]
+    records = sum(Parallel(n_jobs=-1)(delayed(run_once)(s) for s in seeds), [])
 
     # Summarize by influencer count and minority fraction
-    infl_counts = sorted(set(r['infl'] for r in records))
+    stats = summarize(records)
+    infl_counts = sorted(set(ic for ic, _ in stats))
     print("\nInfl | 10% stat 10% fin | 30% stat 30% fin | 40% stat 40% fin")
     print("-"*70)
     for ic in infl_counts:
         row = [f"{ic:>4d}"]
         for frac in minority_fracs:
-            subset = [r for r in records if r['infl']==ic and r['frac']==frac]
-            if subset:
-                s_vals = [r['static'] for r in subset]
-                f_vals = [r['final']  for r in subset]
-                s_mean, s_sd = mean(s_vals), stdev(s_vals) if len(s_vals)>1 else 0
-                f_mean, f_sd = mean(f_vals), stdev(f_vals) if len(f_vals)>1 else 0
+            if (ic, frac) in stats:
+                s_mean, s_sd, f_mean, f_sd = stats[(ic, frac)]
                 row.append(f"{s_mean:6.1f}±{s_sd:<5.1f}")
                 row.append(f"{f_mean:6.1f}±{f_sd:<5.1f}")
             else:
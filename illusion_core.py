@@ -0,0 +1,176 @@
+import numpy as np
+from numba import njit, prange
+from scipy.sparse import csr_array
+
+# Shared graph construction and majority-illusion primitives for ba.py and
+# experiment.py. Graphs are symmetric CSR matrices A with degree vector deg
+# and the matching edge list (src, dst), each undirected edge stored twice;
+# opinions are int8 vectors x (1 = Red, 0 = Blue).
+
+OPINION_LABELS = ('Blue', 'Red')  # display names, indexed by opinion value
+
+def ba_csr(N, m, rng):
+    """Build a Barabási–Albert graph directly as a symmetric CSR adjacency matrix.
+
+    Grows the graph like nx.barabasi_albert_graph (a star on m + 1 nodes, then
+    m distinct preferential-attachment targets per new node), but draws each
+    target from the flat array of edge endpoints, where a node appears once
+    per incident edge, so no Graph object is ever built.
+
+    Returns (A, src, dst), where src/dst are the int32 edge endpoints in both
+    directions that A was assembled from.
+    """
+    if m < 1 or m >= N:
+        raise ValueError(
+            f"Barabási–Albert network must have m >= 1 and m < n, m = {m}, n = {N}"
+        )
+    E = m + (N - m - 1) * m
+    rows = np.empty(E, dtype=np.int32)
+    cols = np.empty(E, dtype=np.int32)
+    ends = np.empty(2 * E, dtype=np.int32)
+    # initial star: node 0 joined to nodes 1..m
+    rows[:m] = 0
+    cols[:m] = np.arange(1, m + 1)
+    ends[0:2*m:2] = 0
+    ends[1:2*m:2] = cols[:m]
+    e = m
+    for v in range(m + 1, N):
+        targets = set()
+        while len(targets) < m:
+            targets.add(int(ends[rng.integers(2 * e)]))
+        for u in targets:
+            rows[e], cols[e] = v, u
+            ends[2*e], ends[2*e + 1] = v, u
+            e += 1
+    data = np.ones(2 * E, dtype=np.int32)
+    src = np.concatenate([rows, cols])
+    dst = np.concatenate([cols, rows])
+    return csr_array((data, (src, dst)), shape=(N, N)), src, dst
+
+def make_graph(N, m, seed):
+    """Return (A, deg, (src, dst)) for a BA graph; seed is an int or an np.random.Generator."""
+    A, src, dst = ba_csr(N, m, np.random.default_rng(seed))
+    deg = np.asarray(A.sum(axis=1)).ravel()
+    return A, deg, (src, dst)
+
+def influencers(deg):
+    """Return array of nodes with degree > 2 × average degree."""
+    return np.flatnonzero(deg > 2 * deg.mean())
+
+def global_majority(x):
+    """Return 1 (Red) if Red holds a strict global majority, else 0 (Blue)."""
+    red = int(x.sum())
+    return int(red > len(x) - red)
+
+def illusion_mask(edges, deg, x):
+    """Boolean mask of nodes whose strict local majority differs from the global one."""
+    src, dst = edges
+    r = np.bincount(src, weights=x[dst], minlength=len(deg)).astype(np.int32)
+    b = deg - r
+    # r == b also drops isolated nodes
+    return (r != b) & ((r > b) != (global_majority(x) == 1))
+
+def pack_opinions(x):
+    """Pack an opinion vector into a uint64 bitset: bit v & 63 of word v >> 6 is 1 if v is Red."""
+    words = np.zeros((len(x) + 63) // 64 * 8, dtype=np.uint8)
+    packed = np.packbits(np.asarray(x, dtype=bool), bitorder='little')
+    words[:len(packed)] = packed
+    return words.view(np.uint64)
+
+def unpack_opinions(bits, N):
+    """Expand a packed bitset back into an int8 opinion vector of length N."""
+    return np.unpackbits(bits.view(np.uint8), count=N, bitorder='little').view(np.int8)
+
+@njit(cache=True)
+def is_red(bits, v):
+    """Opinion bit of node v in a packed bitset."""
+    return np.int64((bits[v >> 6] >> np.uint64(v & 63)) & np.uint64(1))
+
+@njit(cache=True)
+def is_illusioned(r, b, global_red):
+    """Strict local majority (r red vs b blue neighbours) differs from the global one."""
+    return r != b and (r > b) != global_red
+
+@njit(cache=True, parallel=True)
+def threshold_step(indptr, indices, bits, deg, phi, global_red, bits_new):
+    """One diffusion round on packed opinions: Blue nodes flip once red neighbours exceed phi * degree.
+
+    Returns (illusion count before the update, red count after it).
+    """
+    N = len(deg)
+    illusions = 0
+    red = 0
+    # one word per iteration, so no two threads write the same word
+    for w in prange(len(bits)):
+        word = bits[w]
+        for j in range(min(64, N - w * 64)):
+            v = w * 64 + j
+            red_nbrs = 0
+            for k in range(indptr[v], indptr[v + 1]):
+                red_nbrs += is_red(bits, indices[k])
+            if is_illusioned(red_nbrs, deg[v] - red_nbrs, global_red):
+                illusions += 1
+            mask = np.uint64(1) << np.uint64(j)
+            if red_nbrs > phi * deg[v]:
+                word |= mask
+            if word & mask:
+                red += 1
+        bits_new[w] = word
+    return illusions, red
+
+@njit(cache=True, parallel=True)
+def majority_step(indptr, indices, bits, deg, global_red, bits_new):
+    """One reversible majority-vote round on packed opinions, written into bits_new.
+
+    Returns (illusion count before the update, red count after it).
+    """
+    N = len(deg)
+    illusions = 0
+    red = 0
+    # one word per iteration, so no two threads write the same word
+    for w in prange(len(bits)):
+        word = bits[w]
+        for j in range(min(64, N - w * 64)):
+            v = w * 64 + j
+            r = 0
+            for k in range(indptr[v], indptr[v + 1]):
+                r += is_red(bits, indices[k])
+            b = deg[v] - r
+            if is_illusioned(r, b, global_red):
+                illusions += 1
+            # adopt the strict local majority; ties (and isolated nodes) keep their opinion
+            mask = np.uint64(1) << np.uint64(j)
+            if r > b:
+                word |= mask
+            elif b > r:
+                word &= ~mask
+            if word & mask:
+                red += 1
+        bits_new[w] = word
+    return illusions, red
+
+def diffuse(A, deg, x_init, phi, max_rounds, reversible=False):
+    """Run opinion dynamics; return the illusion count series and final opinions.
+
+    The default is monotone threshold diffusion (Blue -> Red once red
+    neighbours exceed phi * degree); reversible=True runs majority-vote
+    dynamics instead, where phi is unused.
+    """
+    N = len(deg)
+    bits = pack_opinions(x_init)
+    bits_new = np.empty_like(bits)
+    # the kernels count illusions from the same neighbour tallies they use
+    # for the update and report the new red total, so no extra pass is needed
+    total_red = int(np.count_nonzero(x_init))
+    illusion_series = []
+    for _ in range(max_rounds):
+        global_red = 2 * total_red > N
+        if reversible:
+            count, total_red = majority_step(A.indptr, A.indices, bits, deg, global_red, bits_new)
+        else:
+            count, total_red = threshold_step(A.indptr, A.indices, bits, deg, phi, global_red, bits_new)
+        illusion_series.append(int(count))
+        if np.array_equal(bits_new, bits):
+            break
+        bits, bits_new = bits_new, bits
+    return illusion_series, unpack_opinions(bits, N)